@@ -11,12 +11,14 @@ REQUIREMENTS:
    - polars
    - requests
    - json5
-   - openpyxl, fastexcel, xlsxwriter (for Excel file operations)
+   - orjson
+   - openpyxl, fastexcel, rustpy-xlsxwriter (for Excel file operations)
    - lxml (for HTML parsing)
 
 3. Required files in the same folder:
-   - old_valid_licences.xlsx
-   - old_valid_licence_coordinates.xlsx
+   - old_valid_licences.parquet
+   - old_valid_licence_coordinates.parquet
+   (the .xlsx backups of earlier versions are converted on first run)
 
 4. Internet connection to access https://cmcs.mrpam.gov.mn
 
@@ -34,8 +36,8 @@ OUTPUT FILES:
 -------------
 - valid_licences.xlsx (updated license information)
 - valid_licence_coordinates.xlsx (updated coordinate data)
-- old_valid_licences.xlsx (backup for next run)
-- old_valid_licence_coordinates.xlsx (backup for next run)
+- old_valid_licences.parquet (backup for next run)
+- old_valid_licence_coordinates.parquet (backup for next run)
 
 """
 
@@ -60,53 +62,99 @@ required_packages = {
     'polars': 'polars',
     'requests': 'requests',
     'json5': 'json5',
+    'orjson': 'orjson',
     'openpyxl': 'openpyxl',
     'fastexcel': 'fastexcel',
-    'xlsxwriter': 'XlsxWriter',
+    'rustpy_xlsxwriter': 'rustpy-xlsxwriter',
     'lxml': 'lxml'
 }
 
-missing_packages = []
-for import_name, package_name in required_packages.items():
-    try:
-        __import__(import_name)
-    except ImportError:
-        missing_packages.append(package_name)
+# The package probe is skipped while a sentinel newer than this script exists
+deps_sentinel = os.path.join(script_dir, '.deps_ok')
+deps_verified = (
+    os.path.exists(deps_sentinel)
+    and os.path.getmtime(deps_sentinel) > os.path.getmtime(os.path.abspath(__file__))
+)
 
-if missing_packages:
-    print(f"[!] Missing packages detected: {', '.join(missing_packages)}")
-    print("Installing missing packages... This may take a few minutes.")
+if deps_verified:
+    print("[OK] Required packages were verified on a previous run")
     print()
-    
-    for package in missing_packages:
+else:
+    missing_packages = []
+    for import_name, package_name in required_packages.items():
         try:
-            print(f"Installing {package}...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", package, "--quiet"])
-            print(f"[OK] {package} installed successfully")
-        except subprocess.CalledProcessError as e:
-            print(f"[X] ERROR: Failed to install {package}")
-            print(f"   Details: {str(e)}")
-            print("\nPlease install manually using: pip install -r requirements.txt")
-            input("\nPress Enter to exit...")
-            sys.exit(1)
+            __import__(import_name)
+        except ImportError:
+            missing_packages.append(package_name)
+
+    if missing_packages:
+        print(f"[!] Missing packages detected: {', '.join(missing_packages)}")
+        print("Installing missing packages... This may take a few minutes.")
+        print()
     
-    print()
-    print("[OK] All required packages installed successfully")
-    print()
-else:
-    print("[OK] All required packages are already installed")
-    print()
+        for package in missing_packages:
+            try:
+                print(f"Installing {package}...")
+                subprocess.check_call([sys.executable, "-m", "pip", "install", package, "--quiet"])
+                print(f"[OK] {package} installed successfully")
+            except subprocess.CalledProcessError as e:
+                print(f"[X] ERROR: Failed to install {package}")
+                print(f"   Details: {str(e)}")
+                print("\nPlease install manually using: pip install -r requirements.txt")
+                input("\nPress Enter to exit...")
+                sys.exit(1)
+    
+        print()
+        print("[OK] All required packages installed successfully")
+        print()
+    else:
+        print("[OK] All required packages are already installed")
+        print()
 
 # Now import all required packages
-from tqdm import tqdm
-from bs4 import BeautifulSoup
-import polars as pl
-import requests
-import json5
+try:
+    from tqdm import tqdm
+    from bs4 import BeautifulSoup
+    import polars as pl
+    from rustpy_xlsxwriter import FastExcel
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    import json5
+    import orjson
+except ImportError:
+    if not deps_verified:
+        raise
+    # A package went missing since the last check: drop the sentinel and
+    # restart so the install flow runs again
+    print("[!] A required package could not be imported, re-checking packages...")
+    print()
+    os.remove(deps_sentinel)
+    sys.exit(subprocess.call([sys.executable, os.path.abspath(__file__)] + sys.argv[1:]))
+
+# Only mark packages as verified once the real imports have succeeded
+if not deps_verified:
+    with open(deps_sentinel, 'w'):
+        pass
+
+from concurrent.futures import ThreadPoolExecutor
+import json
 import time
 import math
 import re
 
+# Coordinate object embedded in the inline script of a license details page.
+# Matched directly on the raw response bytes, no HTML parsing needed; the
+# name must stand alone and the object must not run past its own script.
+COORD_RE = re.compile(rb'(?<![\w$])i\s*=\s*(\{(?:(?!</script).)+?\}),(?:e=new f|\s*</script>)', re.DOTALL)
+
+# Normalizations applied to the coordinate blob before JSON parsing
+TRAIL_SEMI_RE = re.compile(r';\s*$')
+TRUE_RE = re.compile(r':\s*!0\b')
+FALSE_RE = re.compile(r':\s*!1\b')
+BARE_KEY_RE = re.compile(r'([{,]\s*)([A-Za-z_$][A-Za-z0-9_$]*)\s*:')
+UNDEFINED_RE = re.compile(r'\bundefined\b')
+
 # Set UTF-8 encoding for console output
 if sys.platform == 'win32':
     import codecs
@@ -120,8 +168,11 @@ print()
 
 # Check for required files
 print("Checking required files...")
-required_files = ["old_valid_licences.xlsx", "old_valid_licence_coordinates.xlsx"]
-missing_files = [f for f in required_files if not os.path.exists(f)]
+required_files = ["old_valid_licences", "old_valid_licence_coordinates"]
+missing_files = [
+    f"{f}.parquet" for f in required_files
+    if not os.path.exists(f"{f}.parquet") and not os.path.exists(f"{f}.xlsx")
+]
 
 if missing_files:
     print(f"\n[X] ERROR: Missing required files:")
@@ -140,21 +191,63 @@ login_data = {
     'Password': "PASSWORDHERE"
 }
 
+# Column types of the license and coordinate tables
+licence_schema = {
+    'OBJECTID': pl.Int64,
+    'ID': pl.Int64,
+    'Code': pl.String,
+    'Name': pl.String,
+    'Type': pl.String,
+    'Status': pl.String,
+    'Holder': pl.String,
+    'Area': pl.Float64
+}
+coordinate_schema = {
+    'ID': pl.Int64,
+    'Point': pl.Int64,
+    'Longitude': pl.Float64,
+    'Latitude': pl.Float64
+}
+
+def load_backup(name, schema):
+    parquet_path = f"./{name}.parquet"
+    if os.path.exists(parquet_path):
+        return pl.read_parquet(parquet_path)
+    
+    # One-time migration of the Excel backups written by earlier versions
+    df = pl.read_excel(f"./{name}.xlsx", engine='calamine', schema_overrides=schema)
+    df.write_parquet(parquet_path, compression='zstd', compression_level=3)
+    print(f"[OK] Converted {name}.xlsx to {name}.parquet")
+    return df
+
 print("Loading existing license data...")
 try:
-    old_valid_licences_df = pl.read_excel("./old_valid_licences.xlsx")
-    old_valid_licences_coordinates_df = pl.read_excel("./old_valid_licence_coordinates.xlsx")
+    old_valid_licences_df = load_backup("old_valid_licences", licence_schema)
+    old_valid_licences_coordinates_df = load_backup("old_valid_licence_coordinates", coordinate_schema)
     print(f"[OK] Loaded {len(old_valid_licences_df)} existing licenses")
     print()
 except Exception as e:
-    print(f"\n[X] ERROR: Failed to read existing Excel files")
+    print(f"\n[X] ERROR: Failed to read existing backup files (old_*.parquet / old_*.xlsx)")
     print(f"   Details: {str(e)}")
     input("\nPress Enter to exit...")
     sys.exit(1)
 
 print("Connecting to CMCS system...")
 session = requests.Session()
+session.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    # GridData and Details POSTs are read-only, so they are safe to retry
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset({'GET', 'POST'})
+    )
+))
 session.headers.update({
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
     'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
     'X-Requested-With': 'XMLHttpRequest',
     'Origin': 'https://cmcs.mrpam.gov.mn',
@@ -219,24 +312,28 @@ except Exception as e:
     input("\nPress Enter to exit...")
     sys.exit(1)
 
+def fetch_licence_page(page):
+    valid_licences_chunk = session.post(
+        url='https://cmcs.mrpam.gov.mn/CMCS//License/GridData',
+        data= {
+            'indexType': '2',
+            '_search': 'false',
+            'nd': str(int(time.time() * 1000)),
+            'rows': '1000',
+            'page': str(page),
+            'sidx': 'Id',
+            'sord': 'desc'
+        }
+    )
+    return [row['cell'] for row in orjson.loads(valid_licences_chunk.content)['rows']]
+
 current_valid_licences_list = []
 try:
-    for page in tqdm(range(1, math.ceil(valid_licences_count/1000) + 1), desc='Fetching valid licences', file=sys.stdout):
-        
-        valid_licences_chunk = session.post(
-            url='https://cmcs.mrpam.gov.mn/CMCS//License/GridData',
-            data= {
-                'indexType': '2',
-                '_search': 'false',
-                'nd': str(int(time.time() * 1000)),
-                'rows': '1000',
-                'page': str(page),
-                'sidx': 'Id',
-                'sord': 'desc'
-            }
-        )
-        
-        current_valid_licences_list.extend([row['cell'] for row in valid_licences_chunk.json()['rows']])
+    pages = range(1, math.ceil(valid_licences_count/1000) + 1)
+    # executor.map yields pages in order, so OBJECTID numbering is unchanged
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for rows in tqdm(executor.map(fetch_licence_page, pages), total=len(pages), desc='Fetching valid licences', file=sys.stdout):
+            current_valid_licences_list.extend(rows)
     
     print()
 except Exception as e:
@@ -257,23 +354,15 @@ try:
             offset=1
         ).select(
             ['OBJECTID', 'ID', 'Code', 'Name', 'Type', 'Status', 'Holder', 'Area']
-        ).cast({
-            'OBJECTID': pl.Int64,
-            'ID': pl.Int64,
-            'Code': pl.String,
-            'Name': pl.String,
-            'Type': pl.String,
-            'Status': pl.String,
-            'Holder': pl.String,
-            'Area': pl.Float64
-        })
+        ).cast(licence_schema)
     )
         
+    current_ids = current_valid_licences_df['ID']
     new_valid_licences_df = (
         pl.concat([old_valid_licences_df, current_valid_licences_df])
         .unique(subset='ID', keep='last')
         .with_columns(
-            pl.when(~pl.col('ID').is_in(current_valid_licences_df['ID'].to_list()))
+            pl.when(~pl.col('ID').is_in(current_ids.implode()))
             .then(pl.lit('NotValid'))
             .otherwise(pl.col('Status'))
             .alias('Status')
@@ -284,10 +373,13 @@ try:
         })
     )
     
-    added_valid_licences = [licence for licence in current_valid_licences_list if licence[0] not in old_valid_licences_df['ID'].to_list()]
+    added_valid_licences_df = current_valid_licences_df.join(
+        old_valid_licences_df.select('ID'), on='ID', how='anti'
+    )
+    added_licence_ids = added_valid_licences_df['ID'].to_list()
     
     print(f"[OK] Processed license data")
-    print(f"  - New licenses found: {len(added_valid_licences)}")
+    print(f"  - New licenses found: {len(added_licence_ids)}")
     print()
     
 except Exception as e:
@@ -297,7 +389,7 @@ except Exception as e:
     sys.exit(1)
 
 # Check if there are new licenses to process
-if len(added_valid_licences) == 0:
+if len(added_licence_ids) == 0:
     print("=" * 70)
     print("[i] INFO: No new licenses found")
     print("=" * 70)
@@ -307,29 +399,45 @@ if len(added_valid_licences) == 0:
     input("Press Enter to exit...")
     sys.exit(0)
 
-print(f"Downloading coordinate data for {len(added_valid_licences)} new licenses...")
+print(f"Downloading coordinate data for {len(added_licence_ids)} new licenses...")
 print("This may take a few minutes...")
 print()
 
+def fetch_licence_coordinates(licence_id):
+    # Returns (ID, coordinates) on success or (ID, exception) on failure
+    try:
+        resp = session.post(f'https://cmcs.mrpam.gov.mn/CMCS/License/Details/{licence_id}')
+        coordinate_data = COORD_RE.search(resp.content)
+        cleaned_coordinate_data = coordinate_data.group(1).decode('utf-8').strip()
+        cleaned_coordinate_data = TRAIL_SEMI_RE.sub('', cleaned_coordinate_data)
+        cleaned_coordinate_data = TRUE_RE.sub(': true', cleaned_coordinate_data)
+        cleaned_coordinate_data = FALSE_RE.sub(': false', cleaned_coordinate_data)
+        # Quote bare JS keys so the C-accelerated json module can parse it;
+        # fall back to json5 on the unmodified blob for anything unusual
+        json_coordinate_data = BARE_KEY_RE.sub(r'\1"\2":', cleaned_coordinate_data)
+        json_coordinate_data = UNDEFINED_RE.sub('null', json_coordinate_data)
+        try:
+            return licence_id, json.loads(json_coordinate_data)
+        except json.JSONDecodeError:
+            return licence_id, json5.loads(cleaned_coordinate_data)
+    except Exception as e:
+        return licence_id, e
+
 added_licence_coordinates_list = []
 failed_coordinates = []
 
 try:
-    for licence in tqdm(added_valid_licences, desc='Fetching coordinates for new valid licences', file=sys.stdout):
-        try:
-            resp = session.post(f'https://cmcs.mrpam.gov.mn/CMCS/License/Details/{licence[0]}')
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            script_tag = soup.find('script', type='text/javascript')
-            
-            coordinate_data = re.search(r'i\s*=\s*(\{.+?\}),(?:e=new f|$)', script_tag.string, re.DOTALL)
-            cleaned_coordinate_data = coordinate_data.group(1).strip()
-            cleaned_coordinate_data = re.sub(r';\s*$', '', cleaned_coordinate_data)
-            cleaned_coordinate_data = re.sub(r':\s*!0\b', ': true', cleaned_coordinate_data)
-            cleaned_coordinate_data = re.sub(r':\s*!1\b', ': false', cleaned_coordinate_data)
-            added_licence_coordinates_list.append(json5.loads(cleaned_coordinate_data))
-        except Exception as e:
-            failed_coordinates.append((licence[0], str(e)))
-            continue
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        for licence_id, result in tqdm(
+            executor.map(fetch_licence_coordinates, added_licence_ids),
+            total=len(added_licence_ids),
+            desc='Fetching coordinates for new valid licences',
+            file=sys.stdout
+        ):
+            if isinstance(result, Exception):
+                failed_coordinates.append((licence_id, str(result)))
+            else:
+                added_licence_coordinates_list.append(result)
     
     print()
     
@@ -349,26 +457,25 @@ except Exception as e:
 
 print("Processing coordinate data...")
 try:
-    added_licence_coordinates_df = pl.DataFrame()
+    # Flatten all rings into columns and build the frame in a single pass
+    ids, points, longitudes, latitudes = [], [], [], []
     for coordinates in added_licence_coordinates_list:
-        df_tmp = (
-            pl.DataFrame(
-                coordinates['Geometry']['rings'][0],
-                schema=['Longitude', 'Latitude'],
-                orient='row'
-            ).with_columns(
-                pl.lit(int(coordinates['Id'])).alias('ID'),
-                (pl.int_range(pl.len()) + 1).alias('Point')
-            ).select(
-                ['ID', 'Point', 'Longitude', 'Latitude']
-            ).cast({
-                'ID': pl.Int64,
-                'Point': pl.Int64,
-                'Longitude': pl.Float64,
-                'Latitude': pl.Float64
-            })
-        )
-        added_licence_coordinates_df = pl.concat([added_licence_coordinates_df, df_tmp])
+        ring = coordinates['Geometry']['rings'][0]
+        licence_id = int(coordinates['Id'])
+        ids.extend([licence_id] * len(ring))
+        points.extend(range(1, len(ring) + 1))
+        longitudes.extend(float(point[0]) for point in ring)
+        latitudes.extend(float(point[1]) for point in ring)
+    
+    added_licence_coordinates_df = pl.DataFrame(
+        {
+            'ID': ids,
+            'Point': points,
+            'Longitude': longitudes,
+            'Latitude': latitudes
+        },
+        schema=coordinate_schema
+    )
     
     new_licence_coordinates_df = (
         pl.concat([old_valid_licences_coordinates_df, added_licence_coordinates_df])
@@ -383,21 +490,35 @@ except Exception as e:
     input("\nPress Enter to exit...")
     sys.exit(1)
 
-print("Saving updated data to Excel files...")
+print("Saving updated data to Excel and backup files...")
 try:
-    new_valid_licences_df.write_excel("./valid_licences.xlsx")
-    new_licence_coordinates_df.write_excel("./valid_licence_coordinates.xlsx")
+    # The two Excel outputs are independent, so write them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        excel_futures = [
+            executor.submit(FastExcel("./valid_licences.xlsx", autofit=False).sheet('Sheet1', new_valid_licences_df).save),
+            executor.submit(FastExcel("./valid_licence_coordinates.xlsx", autofit=False).sheet('Sheet1', new_licence_coordinates_df).save)
+        ]
+        for future in excel_futures:
+            future.result()
     
-    new_valid_licences_df.write_excel("./old_valid_licences.xlsx")
-    new_licence_coordinates_df.write_excel("./old_valid_licence_coordinates.xlsx")
+    # Backups are only read back by this script, so keep them as Parquet.
+    # They are written only after both outputs saved: otherwise a failed
+    # Excel write would leave backups that hide the new licenses next run.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        backup_futures = [
+            executor.submit(new_valid_licences_df.write_parquet, "./old_valid_licences.parquet", compression='zstd', compression_level=3),
+            executor.submit(new_licence_coordinates_df.write_parquet, "./old_valid_licence_coordinates.parquet", compression='zstd', compression_level=3)
+        ]
+        for future in backup_futures:
+            future.result()
     
     print("[OK] Files saved successfully")
     print()
     
 except Exception as e:
-    print(f"\n[X] ERROR: Failed to save Excel files")
+    print(f"\n[X] ERROR: Failed to save output or backup files")
     print(f"   Details: {str(e)}")
-    print("\nPlease ensure the files are not open in Excel and try again.")
+    print("\nPlease ensure the .xlsx and old_*.parquet files are not open in another program and try again.")
     input("\nPress Enter to exit...")
     sys.exit(1)
 
@@ -407,7 +528,7 @@ print("=" * 70)
 print()
 print(f"Summary:")
 print(f"  - Total licenses in system: {len(new_valid_licences_df)}")
-print(f"  - New licenses added: {len(added_valid_licences)}")
+print(f"  - New licenses added: {len(added_licence_ids)}")
 print(f"  - Coordinate points added: {len(added_licence_coordinates_df)}")
 print()
 print("Output files:")